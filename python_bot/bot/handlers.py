@@ -1,11 +1,12 @@
+import io
 import logging
 import os
-import tempfile
-import json
 import base64
 import re
+import time
+import orjson
+from collections import OrderedDict
 from urllib.parse import quote
-from pydub import AudioSegment
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Message
 from telegram.ext import ContextTypes
 
@@ -15,15 +16,46 @@ from python_bot.core.openai_client import openai_client
 from python_bot.core.raydium_helpers import get_clmm_deposit_amounts
 from python_bot.bot.utils import escape_markdown_v2
 
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 USE_MOCK_VOICE = os.getenv("USE_MOCK_VOICE_TRANSCRIPTION", "False").lower() in ("true", "1", "t")
 WEBHOOK_URL = os.getenv("WEBHOOK_URL")
 TX_BUILDER_URL = os.getenv("TX_BUILDER_URL")
 
+if not TX_BUILDER_URL:
+    raise ValueError("TX_BUILDER_URL is not set in the environment!")
+
+TX_BUILDER_BASE_URL = TX_BUILDER_URL.rstrip('/')
+
+# Matches the first standalone number in a message. The lookarounds avoid capturing
+# version numbers like "v2" or trailing dots.
+_AMOUNT_RE = re.compile(r"(?<![a-zA-Z])\b(\d+\.?\d*|\.\d+)\b(?![a-zA-Z])")
+
+# Words that mean the user doesn't want the proposed pool. Matched as whole words so
+# that e.g. "now" or "nothing" isn't mistaken for "no".
+_REJECTION_RE = re.compile(r"\b(?:no|reject|different|another|cancel|stop)\b", re.IGNORECASE)
+
+# Proposals kept per user. Older or expired ones are evicted so user_data stays small.
+MAX_STORED_PROPOSALS = 8
+PROPOSAL_TTL_SECONDS = 900  # 15 minutes
+
+# --- Message Templates (MarkdownV2) ---
+# Placeholders are filled with values that were already escaped by `_escaped_pool_stats`.
+_PROPOSAL_DETAILS_TEMPLATE_MD2 = (
+    "✅ I found a great option for you\\! Here are the details:\n\n"
+    "🔹 *Pool:* `{pool_name}`\n"
+    "🔹 *Liquidity:* {liquidity}\n"
+    "🔹 *Volume \\(24h\\):* {volume}\n"
+    "🔹 *APY \\(24h\\):* {apy}"
+)
+_DEPOSIT_TEMPLATE_MD2 = (
+    "✅ Great\\! You're depositing *{amount} {token_symbol}* into the `{pool_name}` pool\\.\n\n"
+    "🔹 *Liquidity:* {liquidity}\n"
+    "🔹 *Volume \\(24h\\):* {volume}\n"
+    "🔹 *APY \\(24h\\):* {apy}\n\n"
+    "Click the button below to open your wallet and confirm the transaction\\."
+)
+
 
 # --- Helper Functions ---
 
@@ -34,7 +66,7 @@ async def _get_user_input_text(update: Update, context: ContextTypes.DEFAULT_TYP
     """
     if update.message.voice:
         user = update.effective_user
-        logger.info(f"Received voice memo from {user.username}.")
+        logger.info("Received voice memo from %s.", user.username)
         
         if USE_MOCK_VOICE:
             logger.info("--- MOCK: Using fake voice transcription as per .env flag ---")
@@ -46,28 +78,72 @@ async def _get_user_input_text(update: Update, context: ContextTypes.DEFAULT_TYP
 
         try:
             voice_file = await context.bot.get_file(update.message.voice.file_id)
-            with tempfile.TemporaryDirectory() as temp_dir:
-                oga_path = os.path.join(temp_dir, "voice.oga")
-                mp3_path = os.path.join(temp_dir, "voice.mp3")
-                await voice_file.download_to_drive(oga_path)
-                audio = AudioSegment.from_file(oga_path)
-                audio.export(mp3_path, format="mp3")
-                with open(mp3_path, "rb") as audio_file:
-                    transcription = await openai_client.audio.transcriptions.create(model="whisper-1", file=audio_file)
-                logger.info(f"Transcription result: '{transcription.text}'")
-                return transcription.text
+            # Whisper accepts Telegram's OGG/Opus voice notes as-is, so upload the
+            # downloaded bytes directly instead of transcoding them with ffmpeg.
+            # Writing straight into the upload buffer avoids an intermediate bytearray copy.
+            audio_file = io.BytesIO()
+            await voice_file.download_to_memory(out=audio_file)
+            audio_file.seek(0)
+            audio_file.name = "voice.ogg"
+            transcription = await openai_client.audio.transcriptions.create(model="whisper-1", file=audio_file)
+            logger.info("Transcription result: '%s'", transcription.text)
+            return transcription.text
         except Exception as e:
-            logger.error(f"Error processing voice message: {e}", exc_info=True)
+            logger.error("Error processing voice message: %s", e, exc_info=True)
             await update.message.reply_text("Sorry, I had trouble understanding your voice memo. Please try again or send a text message.")
             return None
     
     elif update.message.text:
         user = update.effective_user
-        logger.info(f"Received text from {user.username}: {update.message.text}")
+        logger.info("Received text from %s: %s", user.username, update.message.text)
         return update.message.text
     
     return None
 
+def _escaped_pool_stats(proposal: dict) -> dict[str, str]:
+    """Formats and MarkdownV2-escapes the pool fields shared by the message templates."""
+    return {
+        "pool_name": escape_markdown_v2(proposal["pool_name"]),
+        "liquidity": escape_markdown_v2(f"${proposal['liquidity']:,.0f}"),
+        "volume": escape_markdown_v2(f"${proposal.get('volume_24h', 0):,.0f}"),
+        "apy": escape_markdown_v2(f"{proposal['apy']:.2%}"),
+    }
+
+def _is_proposal_expired(proposal_info: dict) -> bool:
+    """Checks whether a stored proposal is older than the proposal TTL."""
+    return time.time() - proposal_info.get("ts", 0) >= PROPOSAL_TTL_SECONDS
+
+def _store_proposal(user_data: dict, pool_id: str, proposal_info: dict, max_n: int = MAX_STORED_PROPOSALS) -> dict:
+    """
+    Stores a proposal for the user as the most recent entry, dropping expired
+    proposals and the oldest ones beyond `max_n`. Returns the stored entry.
+    """
+    proposals = user_data.get('proposals')
+    if not isinstance(proposals, OrderedDict):
+        proposals = OrderedDict(proposals or {})
+        user_data['proposals'] = proposals
+
+    for expired_id in [pid for pid, p in proposals.items() if _is_proposal_expired(p)]:
+        del proposals[expired_id]
+
+    proposal_info["ts"] = time.time()
+    proposals[pool_id] = proposal_info
+    proposals.move_to_end(pool_id)
+    while len(proposals) > max_n:
+        proposals.popitem(last=False)
+    return proposal_info
+
+def _get_proposal(user_data: dict, pool_id: str) -> dict | None:
+    """Returns the user's stored proposal for `pool_id`, or None if missing or expired."""
+    proposals = user_data.get('proposals', {})
+    proposal_info = proposals.get(pool_id)
+    if proposal_info is None:
+        return None
+    if _is_proposal_expired(proposal_info):
+        proposals.pop(pool_id, None)
+        return None
+    return proposal_info
+
 async def _send_thinking_message(update: Update) -> Message:
     """Sends a standardized 'thinking' message and returns the message object."""
     return await update.message.reply_text(
@@ -76,60 +152,54 @@ async def _send_thinking_message(update: Update) -> Message:
 
 def _parse_amount_from_text(text: str) -> float | None:
     """Finds the first valid number (integer or float) in a string."""
-    # This regex is improved to avoid capturing version numbers like "v2" or trailing dots.
-    numbers = re.findall(r"(?<![a-zA-Z])\b(\d+\.?\d*|\.\d+)\b(?![a-zA-Z])", text)
-    if numbers:
-        try:
-            num = float(numbers[0])
-            return num if num > 0 else None
-        except (ValueError, IndexError):
-            return None
-    return None
+    match = _AMOUNT_RE.search(text)
+    if not match:
+        return None
+    try:
+        num = float(match.group(1))
+    except ValueError:
+        return None
+    return num if num > 0 else None
+
+def _build_action_uri_prefix(proposal: dict) -> str:
+    """
+    Builds the URL-encoded `solana-action:` URI for a proposal's join-pool action,
+    ending right before the `amount` query value.
+    """
+    action_id = base64.urlsafe_b64encode(orjson.dumps(proposal)).decode('utf-8')
+    action_api_url = f"{TX_BUILDER_BASE_URL}/api/actions/join-pool/{action_id}?amount="
+    return quote(f"solana-action:{action_api_url}")
 
 async def _send_final_link(message_to_edit: Message, context: ContextTypes.DEFAULT_TYPE, pool_id: str, amount: float):
     """Generates the final dial.to transaction link and edits the provided message."""
-    proposal_info = context.user_data.get('proposals', {}).get(pool_id)
+    proposal_info = _get_proposal(context.user_data, pool_id)
     if not proposal_info or "data" not in proposal_info:
-        logger.warning(f"Final link generation failed: Proposal {pool_id} not found for user.")
+        logger.warning("Final link generation failed: Proposal %s not found for user.", pool_id)
         await message_to_edit.edit_text(text="Sorry, this proposal has expired. Please send your request again.")
         return
 
     proposal = proposal_info["data"]
 
-    if not TX_BUILDER_URL:
-        logger.error("TX_BUILDER_URL is not set!")
-        await message_to_edit.edit_text("Sorry, the bot is not configured correctly to build transactions.")
-        return
+    # Only the amount differs between sends for the same proposal, so the encoded
+    # action URI up to the amount is computed once and memoized on the proposal.
+    action_uri_prefix = proposal_info.get("action_uri_prefix")
+    if not action_uri_prefix:
+        try:
+            action_uri_prefix = _build_action_uri_prefix(proposal)
+        except Exception as e:
+            logger.error("Failed to encode proposal: %s", e)
+            await message_to_edit.edit_text("Sorry, there was a problem generating your transaction link.")
+            return
+        proposal_info["action_uri_prefix"] = action_uri_prefix
 
-    try:
-        proposal_json = json.dumps(proposal)
-        action_id = base64.urlsafe_b64encode(proposal_json.encode('utf-8')).decode('utf-8')
-    except Exception as e:
-        logger.error(f"Failed to encode proposal: {e}")
-        await message_to_edit.edit_text("Sorry, there was a problem generating your transaction link.")
-        return
-    
-    action_api_url = f"{TX_BUILDER_URL.rstrip('/')}/api/actions/join-pool/{action_id}?amount={amount}"
-    solana_action_uri = f"solana-action:{action_api_url}"
-    encoded_solana_action_uri = quote(solana_action_uri)
-    final_url = f"https://dial.to/?action={encoded_solana_action_uri}"
-
-    logger.info(f"Generated dial.to URL: {final_url}")
-
-    pool_name = escape_markdown_v2(proposal["pool_name"])
-    liquidity_str = escape_markdown_v2(f"${proposal['liquidity']:,.0f}")
-    volume_str = escape_markdown_v2(f"${proposal.get('volume_24h', 0):,.0f}")
-    input_token_symbol = escape_markdown_v2(proposal.get("raw_proposal", {}).get("mintA", {}).get("symbol", "tokens"))
-    amount_str = escape_markdown_v2(f"{amount:g}")
-    apy_str = escape_markdown_v2(f"{proposal['apy']:.2%}")
-
-    message_text = (
-        f"✅ Great\\! You're depositing *{amount_str} {input_token_symbol}* into the `{pool_name}` pool\\.\n\n"
-        f"🔹 *Liquidity:* {liquidity_str}\n"
-        f"🔹 *Volume \\(24h\\):* {volume_str}\n"
-        f"🔹 *APY \\(24h\\):* {apy_str}\n\n"
-        f"Click the button below to open your wallet and confirm the transaction\\."
-    )
+    final_url = f"https://dial.to/?action={action_uri_prefix}{quote(str(amount))}"
+
+    logger.info("Generated dial.to URL: %s", final_url)
+
+    message_values = _escaped_pool_stats(proposal)
+    message_values["amount"] = escape_markdown_v2(f"{amount:g}")
+    message_values["token_symbol"] = escape_markdown_v2(proposal.get("raw_proposal", {}).get("mintA", {}).get("symbol", "tokens"))
+    message_text = _DEPOSIT_TEMPLATE_MD2.format_map(message_values)
     
     keyboard = [[InlineKeyboardButton("🚀 Add Liquidity", url=final_url)]]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -154,14 +224,14 @@ async def _handle_amount_input(update: Update, context: ContextTypes.DEFAULT_TYP
     amount = _parse_amount_from_text(user_input_text)
     
     if amount:
-        logger.info(f"Received amount {amount} for pending pool {pool_id}.")
+        logger.info("Received amount %s for pending pool %s.", amount, pool_id)
         context.user_data['state'] = None
         context.user_data['pending_pool_id'] = None
         placeholder_message = await update.message.reply_text("Got it. Preparing your transaction...")
         await _send_final_link(placeholder_message, context, pool_id, amount)
     else:
-        logger.warning(f"Invalid amount input from user: '{user_input_text}'")
-        proposal_info = context.user_data.get('proposals', {}).get(pool_id, {})
+        logger.warning("Invalid amount input from user: '%s'", user_input_text)
+        proposal_info = _get_proposal(context.user_data, pool_id) or {}
         proposal = proposal_info.get("data", {})
         token_symbol = proposal.get("raw_proposal", {}).get("mintA", {}).get("symbol", "tokens")
         await update.message.reply_text(
@@ -199,29 +269,16 @@ async def _handle_new_query(update: Update, context: ContextTypes.DEFAULT_TYPE,
         return
 
     pool_id = proposal["pool_id"]
-    if 'proposals' not in context.user_data:
-        context.user_data['proposals'] = {}
-    
-    pool_name = escape_markdown_v2(proposal["pool_name"])
-    liquidity_str = escape_markdown_v2(f"${proposal['liquidity']:,.0f}")
-    apy_str = escape_markdown_v2(f"{proposal['apy']:.2%}")
-    volume_str = escape_markdown_v2(f"${proposal.get('volume_24h', 0):,.0f}")
     
-    details_text = (
-        f"✅ I found a great option for you\\! Here are the details:\n\n"
-        f"🔹 *Pool:* `{pool_name}`\n"
-        f"🔹 *Liquidity:* {liquidity_str}\n"
-        f"🔹 *Volume \\(24h\\):* {volume_str}\n"
-        f"🔹 *APY \\(24h\\):* {apy_str}"
-    )
+    details_text = _PROPOSAL_DETAILS_TEMPLATE_MD2.format_map(_escaped_pool_stats(proposal))
     
     message_text = f"{details_text}\n\nDo you want to proceed with this pool?"
     
-    context.user_data['proposals'][pool_id] = {
+    proposal_info = _store_proposal(context.user_data, pool_id, {
         "data": proposal,
         "details_text_md2": details_text,
-    }
-    logger.info(f"Stored proposal {pool_id} for user {user.id}. Amount will be requested after confirmation.")
+    })
+    logger.info("Stored proposal %s for user %s. Amount will be requested after confirmation.", pool_id, user.id)
     
     keyboard = [[
         InlineKeyboardButton("✅ Yes, accept", callback_data=f"accept:{pool_id}"),
@@ -231,7 +288,7 @@ async def _handle_new_query(update: Update, context: ContextTypes.DEFAULT_TYPE,
 
     edited_message = await thinking_message.edit_text(text=message_text, reply_markup=reply_markup, parse_mode="MarkdownV2")
 
-    context.user_data['proposals'][pool_id]['message_id'] = edited_message.message_id
+    proposal_info['message_id'] = edited_message.message_id
     context.user_data['state'] = 'awaiting_proposal_response'
 
 
@@ -240,7 +297,7 @@ async def _handle_new_query(update: Update, context: ContextTypes.DEFAULT_TYPE,
 async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Sends a welcome message with instructions."""
     user = update.effective_user
-    logger.info(f"User {user.username} started the bot.")
+    logger.info("User %s started the bot.", user.username)
     welcome_message = (
         f"Hi {user.mention_html()}! I find the highest APY liquidity pools on Solana based on your risk preferences.\n\n"
         "Just tell me what you're looking for. You can specify:\n\n"
@@ -266,13 +323,14 @@ async def text_and_voice_handler(update: Update, context: ContextTypes.DEFAULT_T
 
     if current_state == 'awaiting_proposal_response':
         amount = _parse_amount_from_text(user_input_text)
-        rejection_keywords = ["no", "reject", "different", "another", "cancel", "stop"]
-        contains_rejection = any(kw in user_input_text.lower() for kw in rejection_keywords)
+        contains_rejection = _REJECTION_RE.search(user_input_text) is not None
 
         if amount and not contains_rejection:
-            logger.info(f"User accepted with amount '{amount}' via text/voice.")
+            logger.info("User accepted with amount '%s' via text/voice.", amount)
             proposals = context.user_data.get('proposals', {})
-            active_pool_id = next((pid for pid, p in proposals.items() if 'message_id' in p), None)
+            active_pool_id = next(
+                (pid for pid, p in proposals.items() if 'message_id' in p and not _is_proposal_expired(p)), None
+            )
             
             if active_pool_id:
                 p_info = proposals[active_pool_id]
@@ -294,7 +352,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await query.answer()
 
     action, pool_id = query.data.split(":", 1)
-    proposal_info = context.user_data.get('proposals', {}).get(pool_id)
+    proposal_info = _get_proposal(context.user_data, pool_id)
     if not proposal_info:
         await query.edit_message_text("Sorry, this proposal has expired. Please send your request again.")
         return
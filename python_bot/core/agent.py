@@ -1,10 +1,66 @@
-import json
 import logging
+import time
+import hashlib
+from collections import OrderedDict
+import orjson
 from python_bot.core.schemas import FIND_LIQUIDITY_POOLS_TOOL
 from python_bot.core.openai_client import openai_client, USE_MOCK_OPENAI
 
 logger = logging.getLogger(__name__)
 
+# --- Caching ---
+# Parsed intents keyed by a hash of the normalized user text, so repeated prompts
+# like "find a low risk pool" skip the OpenAI round trip entirely.
+INTENT_CACHE: "OrderedDict[str, tuple[float, dict, str | None]]" = OrderedDict()
+INTENT_CACHE_MAX_ENTRIES = 4096
+INTENT_CACHE_DURATION_SECONDS = 6 * 3600  # 6 hours
+INTENT_MODEL = "gpt-5-nano"
+
+# --- Prompt ---
+# The system message and tool list are built once so every request sends a
+# byte-identical prefix, which lets OpenAI's server-side prompt cache reuse it.
+# Keep anything per-request (timestamps, user IDs) out of these constants.
+_SYSTEM_MSG = {
+    "role": "system",
+    "content": "You are a helpful DeFi assistant. Your primary task is to determine if the user wants to find a liquidity pool. If they do, use the `find_liquidity_pools` tool to extract their preferences. If the user's message is a greeting or does not seem to be a request for a pool, respond with a friendly, conversational message. If the user does not specify a preference for risk or token rank, use reasonable defaults ('low' risk, rank limit 100).",
+}
+_TOOLS = [FIND_LIQUIDITY_POOLS_TOOL]
+
+# Hardcoded intents returned in mock mode when the message is just a risk level.
+_MOCK_INTENTS = {
+    "low": {"risk_level": "low", "market_cap_rank_limit": 50},
+    "medium": {"risk_level": "medium", "market_cap_rank_limit": 200},
+    "high": {"risk_level": "high", "market_cap_rank_limit": 250},
+}
+
+
+def _intent_cache_key(text: str) -> str:
+    """Hashes the model name and the whitespace/case-normalized user text."""
+    normalized_text = " ".join(text.lower().split())
+    payload = orjson.dumps({"model": INTENT_MODEL, "text": normalized_text}, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def _get_cached_intent(key: str) -> tuple[dict, str | None] | None:
+    """Returns a cached (intent, response) pair, or None on a miss or expired entry."""
+    entry = INTENT_CACHE.get(key)
+    if entry is None:
+        return None
+    timestamp, intent_dict, content = entry
+    if time.time() - timestamp >= INTENT_CACHE_DURATION_SECONDS:
+        del INTENT_CACHE[key]
+        return None
+    INTENT_CACHE.move_to_end(key)
+    return dict(intent_dict), content
+
+
+def _store_cached_intent(key: str, intent_dict: dict, content: str | None) -> None:
+    """Stores only the extracted intent and text response, evicting the oldest entries."""
+    INTENT_CACHE[key] = (time.time(), dict(intent_dict), content)
+    INTENT_CACHE.move_to_end(key)
+    while len(INTENT_CACHE) > INTENT_CACHE_MAX_ENTRIES:
+        INTENT_CACHE.popitem(last=False)
+
 
 async def parse_intent_from_text(text: str) -> tuple[dict, str | None]:
     """
@@ -13,33 +69,28 @@ async def parse_intent_from_text(text: str) -> tuple[dict, str | None]:
     """
     if USE_MOCK_OPENAI:
         normalized_text = text.strip().lower()
-        if normalized_text == "low":
-            logger.info("--- MOCK AGENT: Matched 'low', returning hardcoded low-risk intent ---")
-            return {"risk_level": "low", "market_cap_rank_limit": 50}, None
-        if normalized_text == "medium":
-            logger.info("--- MOCK AGENT: Matched 'medium', returning hardcoded medium-risk intent ---")
-            return {"risk_level": "medium", "market_cap_rank_limit": 200}, None
-        if normalized_text == "high":
-            logger.info("--- MOCK AGENT: Matched 'high', returning hardcoded high-risk intent ---")
-            return {"risk_level": "high", "market_cap_rank_limit": 250}, None
+        mock_intent = _MOCK_INTENTS.get(normalized_text)
+        if mock_intent is not None:
+            logger.info("--- MOCK AGENT: Matched '%s', returning hardcoded %s-risk intent ---", normalized_text, normalized_text)
+            return dict(mock_intent), None
 
     if not openai_client:
         logger.error("OpenAI client not initialized. Cannot parse intent.")
         return {}, "Sorry, the AI model is not configured correctly."
 
-    logger.info(f"--- REAL AGENT: Parsing text: '{text}' ---")
+    cache_key = _intent_cache_key(text)
+    cached = _get_cached_intent(cache_key)
+    if cached is not None:
+        logger.info("--- Using cached intent for text ---")
+        return cached
+
+    logger.info("--- REAL AGENT: Parsing text: '%s' ---", text)
 
     try:
         response = await openai_client.chat.completions.create(
-            model="gpt-5-nano",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful DeFi assistant. Your primary task is to determine if the user wants to find a liquidity pool. If they do, use the `find_liquidity_pools` tool to extract their preferences. If the user's message is a greeting or does not seem to be a request for a pool, respond with a friendly, conversational message. If the user does not specify a preference for risk or token rank, use reasonable defaults ('low' risk, rank limit 100).",
-                },
-                {"role": "user", "content": text},
-            ],
-            tools=[FIND_LIQUIDITY_POOLS_TOOL],
+            model=INTENT_MODEL,
+            messages=[_SYSTEM_MSG, {"role": "user", "content": text}],
+            tools=_TOOLS,
         )
 
         message = response.choices[0].message
@@ -47,13 +98,15 @@ async def parse_intent_from_text(text: str) -> tuple[dict, str | None]:
         if message.tool_calls:
             tool_call = message.tool_calls[0]
             function_args_json = tool_call.function.arguments
-            logger.info(f"LLM returned function arguments: {function_args_json}")
-            intent_dict = json.loads(function_args_json)
+            logger.info("LLM returned function arguments: %s", function_args_json)
+            intent_dict = orjson.loads(function_args_json)
+            _store_cached_intent(cache_key, intent_dict, None)
             return intent_dict, None
         else:
             logger.info("LLM did not call a tool. Returning conversational response.")
+            _store_cached_intent(cache_key, {}, message.content)
             return {}, message.content
 
     except Exception as e:
-        logger.error(f"Error calling OpenAI or parsing response: {e}", exc_info=True)
+        logger.error("Error calling OpenAI or parsing response: %s", e, exc_info=True)
         return {}, "Sorry, I encountered an error trying to understand that."
\ No newline at end of file
@@ -1,9 +1,12 @@
-import requests
+import asyncio
+import httpx
 import logging
 import os
 import time
-import json
-from typing import Set, Dict, Any
+import orjson
+from typing import FrozenSet, Dict, Any
+from cachetools import TTLCache
+from python_bot.core.http_client import get_http_client
 
 logger = logging.getLogger(__name__)
 
@@ -12,8 +15,15 @@ RAYDIUM_POOLS_API_URL = "https://api-v3.raydium.io/pools/info/list?poolType=conc
 COINMARKETCAP_API_URL = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/listings/latest"
 
 # --- Caching ---
-CMC_CACHE: Dict[str, Any] = {"timestamp": 0, "top_ranked_symbols": set()}
 CACHE_DURATION_SECONDS = 3600  # 1 hour
+# Top-ranked symbols per rank limit, so a request for the top 10 never gets the top 100.
+CMC_CACHE: TTLCache[int, FrozenSet[str]] = TTLCache(maxsize=16, ttl=CACHE_DURATION_SECONDS)
+# Serializes fetches so a burst of requests on an expired entry triggers one fetch.
+_CMC_CACHE_LOCK = asyncio.Lock()
+RAYDIUM_CACHE: Dict[str, Any] = {"timestamp": 0, "pools": [], "pools_by_symbol": {}}
+RAYDIUM_CACHE_DURATION_SECONDS = 45
+# Serializes refreshes so a burst of requests on an expired cache triggers one fetch.
+_RAYDIUM_CACHE_LOCK = asyncio.Lock()
 
 # --- Configuration ---
 COINMARKETCAP_API_KEY = os.getenv("COINMARKETCAP_API_KEY")
@@ -22,53 +32,116 @@ RISK_TO_TVL_THRESHOLD = {
     "medium": 1_000_000,
     "high": 100_000,
 }
+# No risk level accepts a pool at or below this TVL, so such pools are never cached.
+MIN_TVL_THRESHOLD = min(RISK_TO_TVL_THRESHOLD.values())
 
 
-async def get_top_ranked_symbols(rank_limit: int) -> Set[str]:
+async def get_top_ranked_symbols(rank_limit: int) -> FrozenSet[str]:
     """
     Fetches symbols of top-ranked tokens from CoinMarketCap, using a 1-hour cache.
-    This is used to filter by market cap.
+    This is used to filter by market cap. Symbols are upper-cased so they can be
+    matched against Raydium's symbols regardless of case.
     """
-    global CMC_CACHE
-    now = time.time()
-
-    if now - CMC_CACHE["timestamp"] < CACHE_DURATION_SECONDS and CMC_CACHE.get("top_ranked_symbols"):
+    top_symbols = CMC_CACHE.get(rank_limit)
+    if top_symbols is not None:
         logger.info("--- Using cached CoinMarketCap data ---")
-        return CMC_CACHE["top_ranked_symbols"]
+        return top_symbols
 
     if not COINMARKETCAP_API_KEY:
         logger.warning("COINMARKETCAP_API_KEY not set. Market cap filtering will be disabled.")
-        return set()
+        return frozenset()
+
+    async with _CMC_CACHE_LOCK:
+        # Another request may have fetched this limit while we waited for the lock.
+        top_symbols = CMC_CACHE.get(rank_limit)
+        if top_symbols is not None:
+            return top_symbols
+
+        logger.info("--- Fetching top %s tokens from CoinMarketCap ---", rank_limit)
+        headers = {'Accepts': 'application/json', 'X-CMC_PRO_API_KEY': COINMARKETCAP_API_KEY}
+        params = {'limit': rank_limit, 'convert': 'USD'}
+
+        try:
+            response = await get_http_client().get(COINMARKETCAP_API_URL, headers=headers, params=params)
+            response.raise_for_status()
+            data = orjson.loads(response.content)
+            
+            # Log the full response for debugging purposes. Serializing it is skipped
+            # entirely unless debug logging is on.
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("--- Full CoinMarketCap API Response ---:\n%s", orjson.dumps(data, option=orjson.OPT_INDENT_2).decode())
 
-    logger.info(f"--- Fetching top {rank_limit} tokens from CoinMarketCap ---")
-    headers = {'Accepts': 'application/json', 'X-CMC_PRO_API_KEY': COINMARKETCAP_API_KEY}
-    params = {'limit': rank_limit, 'convert': 'USD'}
+            top_symbols = {token['symbol'].upper() for token in data.get('data', []) if token.get('symbol')}
+            
+            if 'SOL' in top_symbols:
+                top_symbols.add('WSOL')
 
-    try:
-        response = requests.get(COINMARKETCAP_API_URL, headers=headers, params=params)
+            top_symbols = frozenset(top_symbols)
+            # An empty answer is not cached so the next request retries.
+            if top_symbols:
+                CMC_CACHE[rank_limit] = top_symbols
+            logger.info("Found %s top-ranked symbols from CoinMarketCap.", len(top_symbols))
+            return top_symbols
+        except httpx.HTTPError as e:
+            logger.error("Error fetching data from CoinMarketCap: %s", e)
+            return frozenset()
+
+
+def _index_pools_by_symbol(pools: list[dict]) -> dict[str, list[int]]:
+    """
+    Maps each upper-cased token A symbol to the positions of its pools in the
+    APR-sorted list.
+    """
+    pools_by_symbol: dict[str, list[int]] = {}
+    for position, pool in enumerate(pools):
+        pools_by_symbol.setdefault(pool["mintA"]["symbol"].upper(), []).append(position)
+    return pools_by_symbol
+
+
+def _cached_raydium_pools() -> tuple[list[dict], dict[str, list[int]]] | None:
+    """Returns the cached Raydium pools and their symbol index if they are still fresh."""
+    if time.time() - RAYDIUM_CACHE["timestamp"] < RAYDIUM_CACHE_DURATION_SECONDS and RAYDIUM_CACHE["pools"]:
+        return RAYDIUM_CACHE["pools"], RAYDIUM_CACHE["pools_by_symbol"]
+    return None
+
+
+async def _fetch_raydium_pools() -> tuple[list[dict], dict[str, list[int]]]:
+    """
+    Fetches the concentrated liquidity pools from Raydium, sorted by APR (highest
+    first, ties in 24h volume order), along with an index of pool positions by token
+    A symbol.
+    The pool set changes slowly, so results are shared across requests for a short TTL.
+    """
+    cached = _cached_raydium_pools()
+    if cached is not None:
+        logger.info("--- Using cached Raydium pool data ---")
+        return cached
+
+    async with _RAYDIUM_CACHE_LOCK:
+        # Another request may have refreshed the cache while we waited for the lock.
+        cached = _cached_raydium_pools()
+        if cached is not None:
+            return cached
+
+        response = await get_http_client().get(RAYDIUM_POOLS_API_URL)
         response.raise_for_status()
-        data = response.json()
-        
-        # Log the full response for debugging purposes
-        logger.debug(f"--- Full CoinMarketCap API Response ---:\n{json.dumps(data, indent=2)}")
-
-        top_symbols = set()
-        for token in data.get('data', []):
-            symbol = token.get('symbol')
-            if symbol:
-                top_symbols.add(symbol)
-        
-        if 'SOL' in top_symbols:
-            top_symbols.add('WSOL')
-
-
-        CMC_CACHE["timestamp"] = now
-        CMC_CACHE["top_ranked_symbols"] = top_symbols
-        logger.info(f"Found {len(top_symbols)} top-ranked symbols from CoinMarketCap.")
-        return top_symbols
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error fetching data from CoinMarketCap: {e}")
-        return set()
+        api_pools = orjson.loads(response.content).get("data", {}).get("data", [])
+        # Only pools some risk level could propose are kept, so the rest of the
+        # decoded payload is freed after the fetch instead of living in the cache.
+        pools = [pool for pool in api_pools if pool["tvl"] > MIN_TVL_THRESHOLD]
+        logger.info(
+            "Raydium API returned %s pools, %s above the minimum TVL of $%s.",
+            len(api_pools), len(pools), MIN_TVL_THRESHOLD,
+        )
+        # Sorting once per fetch lets every request stop at the first pool that fits.
+        pools.sort(key=lambda pool: pool["day"]["apr"], reverse=True)
+        pools_by_symbol = _index_pools_by_symbol(pools)
+
+        if pools:
+            RAYDIUM_CACHE["timestamp"] = time.time()
+            RAYDIUM_CACHE["pools"] = pools
+            RAYDIUM_CACHE["pools_by_symbol"] = pools_by_symbol
+        return pools, pools_by_symbol
 
 
 async def find_and_propose_pool(intent: dict) -> dict | None:
@@ -76,55 +149,52 @@ async def find_and_propose_pool(intent: dict) -> dict | None:
     Finds a liquidity pool by combining CoinMarketCap data (for market cap ranking)
     and Raydium data.
     """
-    logger.info(f"--- REAL ENGINE: Searching for pool with intent: {intent} ---")
+    logger.info("--- REAL ENGINE: Searching for pool with intent: %s ---", intent)
 
     risk_level = intent.get("risk_level", "low")
     rank_limit = intent.get("market_cap_rank_limit", 100)
-    tvl_threshold = RISK_TO_TVL_THRESHOLD.get(risk_level, 0)
+    tvl_threshold = RISK_TO_TVL_THRESHOLD.get(risk_level, MIN_TVL_THRESHOLD)
     
-    # 1. Get the list of top-ranked token symbols from CoinMarketCap.
-    top_ranked_symbols = await get_top_ranked_symbols(rank_limit)
-
-    # If CMC filtering is active but fails to return any symbols, we can't proceed.
-    if COINMARKETCAP_API_KEY and not top_ranked_symbols:
-        logger.error("Market cap filtering is enabled but no top-ranked tokens were found. Cannot find a pool.")
-        return None
-
     try:
-        response = requests.get(RAYDIUM_POOLS_API_URL)
-        response.raise_for_status()
-        api_data = response.json()
-        pools = api_data.get("data", {}).get("data", [])
+        # 1. Get the top-ranked token symbols from CoinMarketCap and the Raydium pools.
+        # The two requests are independent, so they run concurrently.
+        top_ranked_symbols, (pools, pools_by_symbol) = await asyncio.gather(
+            get_top_ranked_symbols(rank_limit), _fetch_raydium_pools()
+        )
+
+        # If CMC filtering is active but fails to return any symbols, we can't proceed.
+        if COINMARKETCAP_API_KEY and not top_ranked_symbols:
+            logger.error("Market cap filtering is enabled but no top-ranked tokens were found. Cannot find a pool.")
+            return None
 
         if not pools:
-            logger.warning("Raydium API returned no pools.")
+            logger.warning("Raydium API returned no pools above the minimum TVL of $%s.", MIN_TVL_THRESHOLD)
             return None
 
-        best_pool = None
-        best_apy = -1
-
-        for pool in pools:
-            symbolA = pool.get("mintA", {}).get("symbol")
-            symbolB = pool.get("mintB", {}).get("symbol")
-            tvl_ok = pool.get("tvl", 0) > tvl_threshold
-            
-            # A pool is valid if its TVL is sufficient and, if token filtering is on,
-            # both of its tokens' symbols are in the top-ranked list.
-            is_valid_pair = True
-            if top_ranked_symbols: # Only apply this filter if we have a list of symbols
-                is_valid_pair = symbolA in top_ranked_symbols and symbolB in top_ranked_symbols
-            
-            is_valid = tvl_ok and is_valid_pair
-
-            # Find the valid pool with the highest APY.
-            if is_valid:
-                current_apy = pool.get('day', {}).get('apr', 0)
-                if current_apy > best_apy:
-                    best_apy = current_apy
-                    best_pool = pool
+        # A pool is valid if its TVL is sufficient and, if token filtering is on,
+        # both of its tokens' symbols are in the top-ranked list. With filtering on,
+        # only pools whose token A is top-ranked are visited, via the symbol index,
+        # keeping the APR order, so the check is specialized to token B and TVL.
+        # Raydium pools always carry these keys, so they're read directly.
+        if top_ranked_symbols: # Only apply this filter if we have a list of symbols
+            candidate_positions = sorted(
+                position
+                for symbol in top_ranked_symbols & pools_by_symbol.keys()
+                for position in pools_by_symbol[symbol]
+            )
+            candidate_pools = [pools[position] for position in candidate_positions]
+            is_valid = lambda pool: (
+                pool["tvl"] > tvl_threshold and pool["mintB"]["symbol"].upper() in top_ranked_symbols
+            )
+        else:
+            candidate_pools = pools
+            is_valid = lambda pool: pool["tvl"] > tvl_threshold
+
+        # Pools are sorted by APR, so the first valid one has the highest APY.
+        best_pool = next(filter(is_valid, candidate_pools), None)
 
         if not best_pool:
-            logger.warning(f"No pools found matching criteria: risk='{risk_level}', tvl > ${tvl_threshold}")
+            logger.warning("No pools found matching criteria: risk='%s', tvl > $%s", risk_level, tvl_threshold)
             return None
 
         proposal = {
@@ -135,12 +205,15 @@ async def find_and_propose_pool(intent: dict) -> dict | None:
             "volume_24h": best_pool['day']['volume'],
             "raw_proposal": best_pool
         }
-        logger.info(f"Proposing pool: {proposal['pool_name']} with TVL ${proposal['liquidity']:,.0f} and 24h Vol ${proposal['volume_24h']:,.0f}")
+        logger.info(
+            "Proposing pool: %s with TVL $%.0f and 24h Vol $%.0f",
+            proposal['pool_name'], proposal['liquidity'], proposal['volume_24h'],
+        )
         return proposal
 
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error fetching pool data from Raydium API: {e}", exc_info=True)
+    except httpx.HTTPError as e:
+        logger.error("Error fetching pool data from Raydium API: %s", e, exc_info=True)
         return None
     except Exception as e:
-        logger.error(f"An unexpected error occurred in the engine: {e}", exc_info=True)
+        logger.error("An unexpected error occurred in the engine: %s", e, exc_info=True)
         return None
\ No newline at end of file
@@ -0,0 +1,49 @@
+import asyncio
+
+import httpx
+
+# Shared async HTTP client for the Raydium and CoinMarketCap APIs. Reusing one client
+# keeps connections alive between webhook updates instead of reconnecting per call,
+# and awaiting it keeps the event loop free to serve other updates meanwhile.
+_http_client: httpx.AsyncClient | None = None
+# Pooled connections belong to the event loop that opened them, so the client is
+# only reused on the loop it was created for.
+_http_client_loop: asyncio.AbstractEventLoop | None = None
+
+
+def _build_http_client() -> httpx.AsyncClient:
+    """
+    Builds the shared client. The transport retries failed connection attempts,
+    e.g. after a pooled connection was dropped by the server.
+    """
+    return httpx.AsyncClient(
+        transport=httpx.AsyncHTTPTransport(
+            http2=True,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=20, keepalive_expiry=30),
+            retries=2,
+        ),
+        timeout=httpx.Timeout(10.0),
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Returns the shared client for the running event loop. A new client is created
+    on first use, after `close_http_client`, or when called from a different loop.
+    """
+    global _http_client, _http_client_loop
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client.is_closed or _http_client_loop is not loop:
+        # A client left over from a finished loop can't be closed from this one;
+        # its connections went away with that loop.
+        _http_client = _build_http_client()
+        _http_client_loop = loop
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Closes the shared client, if one is open, so the next call starts a fresh one."""
+    global _http_client, _http_client_loop
+    client, _http_client, _http_client_loop = _http_client, None, None
+    if client is not None and not client.is_closed:
+        await client.aclose()
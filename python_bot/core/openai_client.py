@@ -1,6 +1,7 @@
 import logging
 import os
 import json
+import httpx
 import openai
 from types import SimpleNamespace
 
@@ -49,10 +50,19 @@ if USE_MOCK_OPENAI:
     openai_client = AsyncMockOpenAI()
 else:
     try:
-        openai_client = openai.AsyncOpenAI()
+        # Bursts of webhook updates share a few HTTP/2 connections that stay alive
+        # between messages, instead of paying a TCP + TLS handshake per request.
+        openai_client = openai.AsyncOpenAI(
+            http_client=openai.DefaultAsyncHttpxClient(
+                http2=True,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=90),
+                timeout=httpx.Timeout(30.0, connect=5.0),
+            )
+        )
         logger.info("Successfully initialized real OpenAI client.")
     except openai.OpenAIError as e:
         logger.error(
-            f"Failed to initialize OpenAI client: {e}. "
-            "Functions relying on OpenAI (intent parsing, voice transcription) will not work."
+            "Failed to initialize OpenAI client: %s. "
+            "Functions relying on OpenAI (intent parsing, voice transcription) will not work.",
+            e,
         )
\ No newline at end of file
@@ -1,9 +1,10 @@
+import asyncio
 import logging
-from decimal import Decimal, getcontext
-import requests
-
-# Set precision for Decimal calculations
-getcontext().prec = 50
+import math
+from functools import lru_cache
+from cachetools import TTLCache
+import orjson
+from python_bot.core.http_client import get_http_client
 
 logger = logging.getLogger(__name__)
 
@@ -11,23 +12,108 @@ logger = logging.getLogger(__name__)
 Q64 = 2**64
 MIN_TICK = -443636
 MAX_TICK = 443636
+# Ticks are integers, so a float log is precise enough to locate them.
+LN_1_0001 = math.log(1.0001)
+# 2^128 / sqrt(1.0001)^(2^i) for each bit i of a tick's magnitude, as used by the
+# SDK's tick -> sqrt price conversion. 19 bits cover MAX_TICK.
+_TICK_BASES_X128 = (
+    0xfffcb933bd6fad37aa2d162d1a594001,
+    0xfff97272373d413259a46990580e2139,
+    0xfff2e50f5f656932ef12357cf3c7fdcb,
+    0xffe5caca7e10e4e61c3624eaa0941ccf,
+    0xffcb9843d60f6159c9db58835c926643,
+    0xff973b41fa98c081472e6896dfb254bf,
+    0xff2ea16466c96a3843ec78b326b52860,
+    0xfe5dee046a99a2a811c461f1969c3052,
+    0xfcbe86c7900a88aedcffc83b479aa3a3,
+    0xf987a7253ac413176f2b074cf7815e53,
+    0xf3392b0822b70005940c7a398e4b70f2,
+    0xe7159475a2c29b7443b29c7fa6e889d8,
+    0xd097f3bdfd2022b8845ad8f792aa5825,
+    0xa9f746462d870fdf8a65dc1f90e061e4,
+    0x70d869a156d2a1b890bb3df62baf32f6,
+    0x31be135f97d08fd981231505542fcfa5,
+    0x9aa508b5b7a84e1c677de54f3e99bc8,
+    0x5d6af8dedb81196699c329225ee604,
+    0x2216e584f5fa1ea926041bedfe97,
+)
 
 # --- Data Fetching ---
 
-def get_token_prices(mints: list[str]) -> dict[str, float]:
-    """Fetches token prices in USD from Raydium's API."""
+RAYDIUM_MINT_PRICE_API_URL = "https://api-v3.raydium.io/mint/price"
+
+# Token prices move on a scale of seconds, so each mint's price is reused briefly.
+PRICE_CACHE_DURATION_SECONDS = 20
+_PRICE_CACHE: TTLCache[str, float] = TTLCache(maxsize=1024, ttl=PRICE_CACHE_DURATION_SECONDS)
+# Mints whose price is being fetched, so concurrent lookups share one request.
+_PRICE_REQUESTS_IN_FLIGHT: dict[str, asyncio.Future] = {}
+
+def _parse_token_prices(payload: dict) -> dict[str, float]:
+    """
+    Extracts a mint -> USD price mapping from a Raydium price response. Mints without
+    a positive price are left out, so they read as unavailable rather than as free.
+    """
+    prices = {}
+    for mint, price_data in payload.get('data', {}).items():
+        try:
+            price = float(price_data['price'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if price > 0:
+            prices[mint] = price
+    logger.info("Fetched prices: %s", prices)
+    return prices
+
+async def _fetch_token_prices(mints: list[str]) -> dict[str, float]:
+    """Fetches token prices in USD from Raydium's API using the shared HTTP client."""
     try:
-        url = f"https://api-v3.raydium.io/mint/price?mints={','.join(mints)}"
-        response = requests.get(url)
+        response = await get_http_client().get(f"{RAYDIUM_MINT_PRICE_API_URL}?mints={','.join(mints)}")
         response.raise_for_status()
-        data = response.json().get('data', {})
-        prices = {mint: float(price_data.get('price', 0)) for mint, price_data in data.items()}
-        logger.info(f"Fetched prices: {prices}")
-        return prices
+        return _parse_token_prices(orjson.loads(response.content))
     except Exception as e:
-        logger.error(f"Failed to fetch token prices: {e}")
+        logger.error("Failed to fetch token prices: %s", e)
         return {}
 
+async def get_token_prices(mints: list[str]) -> dict[str, float]:
+    """
+    Fetches token prices in USD from Raydium's API. Prices are cached per mint for
+    a few seconds, and a mint already being fetched by another request is awaited
+    instead of fetched again. Only mints missing from both are requested, in one call.
+    """
+    prices = {}
+    in_flight = {}
+    missing = []
+    for mint in mints:
+        price = _PRICE_CACHE.get(mint)
+        if price is not None:
+            prices[mint] = price
+        elif mint in _PRICE_REQUESTS_IN_FLIGHT:
+            in_flight[mint] = _PRICE_REQUESTS_IN_FLIGHT[mint]
+        else:
+            missing.append(mint)
+
+    if missing:
+        loop = asyncio.get_running_loop()
+        futures = {mint: loop.create_future() for mint in missing}
+        _PRICE_REQUESTS_IN_FLIGHT.update(futures)
+        fetched = {}
+        try:
+            fetched = await _fetch_token_prices(missing)
+            _PRICE_CACHE.update(fetched)
+        finally:
+            for mint, future in futures.items():
+                del _PRICE_REQUESTS_IN_FLIGHT[mint]
+                future.set_result(fetched.get(mint))
+        prices.update(fetched)
+
+    for mint, future in in_flight.items():
+        # Shielded so a cancelled waiter doesn't cancel the future other requests share.
+        price = await asyncio.shield(future)
+        if price is not None:
+            prices[mint] = price
+
+    return prices
+
 # --- Math Helpers (Python port of Raydium SDK math) ---
 
 def mul_div_ceil(a: int, b: int, d: int) -> int:
@@ -35,18 +121,30 @@ def mul_div_ceil(a: int, b: int, d: int) -> int:
     if d == 0: raise ValueError("Division by zero")
     return (a * b + d - 1) // d
 
+@lru_cache(maxsize=8192)
+def _sqrt_price_x64_from_tick(tick: int) -> int:
+    """
+    Calculates the sqrt(price) * 2^64 from a given tick index.
+    Like the SDK, this multiplies together the precomputed factor for each set
+    bit of |tick| in Q128 fixed point, inverting the result for positive ticks.
+    Range ticks recur across deposits into the same pool, so results are memoized.
+    """
+    if not MIN_TICK <= tick <= MAX_TICK:
+        raise ValueError("Tick out of bounds")
+    abs_tick = abs(tick)
+    ratio = 1 << 128
+    for i, base in enumerate(_TICK_BASES_X128):
+        if abs_tick & (1 << i):
+            ratio = (ratio * base) >> 128
+    if tick > 0:
+        ratio = (1 << 256) // ratio
+    return ratio >> 64
+
 class SqrtPriceMath:
     @staticmethod
     def get_sqrt_price_x64_from_tick(tick: int) -> int:
-        """
-        Calculates the sqrt(price) * 2^64 from a given tick index.
-        This is a Python approximation of the SDK's bitwise-heavy function.
-        """
-        if not MIN_TICK <= tick <= MAX_TICK:
-            raise ValueError("Tick out of bounds")
-        price = Decimal("1.0001") ** Decimal(tick)
-        sqrt_price = price.sqrt()
-        return int(sqrt_price * Q64)
+        """Calculates the sqrt(price) * 2^64 from a given tick index."""
+        return _sqrt_price_x64_from_tick(tick)
 
 class LiquidityMath:
     @staticmethod
@@ -61,56 +159,30 @@ class LiquidityMath:
         if sqrt_price_lower_x64 > sqrt_price_upper_x64:
             sqrt_price_lower_x64, sqrt_price_upper_x64 = sqrt_price_upper_x64, sqrt_price_lower_x64
 
-        amount_a = 0
-        amount_b = 0
-
+        # The token A/B formulas are inlined rather than called per token, since the
+        # bounds are already ordered.
         if sqrt_price_current_x64 <= sqrt_price_lower_x64:
-            amount_a = LiquidityMath._get_token_a_from_liquidity(
-                sqrt_price_lower_x64, sqrt_price_upper_x64, liquidity, round_up
-            )
+            sqrt_price_a_x64, sqrt_price_b_x64 = sqrt_price_lower_x64, sqrt_price_lower_x64
         elif sqrt_price_current_x64 < sqrt_price_upper_x64:
-            amount_a = LiquidityMath._get_token_a_from_liquidity(
-                sqrt_price_current_x64, sqrt_price_upper_x64, liquidity, round_up
-            )
-            amount_b = LiquidityMath._get_token_b_from_liquidity(
-                sqrt_price_lower_x64, sqrt_price_current_x64, liquidity, round_up
-            )
+            sqrt_price_a_x64, sqrt_price_b_x64 = sqrt_price_current_x64, sqrt_price_current_x64
         else:
-            amount_b = LiquidityMath._get_token_b_from_liquidity(
-                sqrt_price_lower_x64, sqrt_price_upper_x64, liquidity, round_up
-            )
-        
-        return int(amount_a), int(amount_b)
-
-    @staticmethod
-    def _get_token_a_from_liquidity(sqrt_price_x64_a: int, sqrt_price_x64_b: int, liquidity: int, round_up: bool) -> int:
-        """Helper for calculating amount of token A."""
-        if sqrt_price_x64_a > sqrt_price_x64_b:
-            sqrt_price_x64_a, sqrt_price_x64_b = sqrt_price_x64_b, sqrt_price_x64_a
-        
-        numerator1 = liquidity << 64
-        numerator2 = sqrt_price_x64_b - sqrt_price_x64_a
+            sqrt_price_a_x64, sqrt_price_b_x64 = sqrt_price_upper_x64, sqrt_price_upper_x64
 
+        liquidity_x64 = liquidity << 64
+        delta_a = sqrt_price_upper_x64 - sqrt_price_a_x64
+        delta_b = sqrt_price_b_x64 - sqrt_price_lower_x64
         if round_up:
-            term1 = mul_div_ceil(numerator1, numerator2, sqrt_price_x64_b)
-            return mul_div_ceil(term1, 1, sqrt_price_x64_a)
+            amount_a = mul_div_ceil(mul_div_ceil(liquidity_x64, delta_a, sqrt_price_upper_x64), 1, sqrt_price_a_x64)
+            amount_b = mul_div_ceil(liquidity, delta_b, Q64)
         else:
-            return (numerator1 * numerator2 // sqrt_price_x64_b) // sqrt_price_x64_a
+            amount_a = liquidity_x64 * delta_a // sqrt_price_upper_x64 // sqrt_price_a_x64
+            amount_b = liquidity * delta_b >> 64
 
-    @staticmethod
-    def _get_token_b_from_liquidity(sqrt_price_x64_a: int, sqrt_price_x64_b: int, liquidity: int, round_up: bool) -> int:
-        """Helper for calculating amount of token B."""
-        if sqrt_price_x64_a > sqrt_price_x64_b:
-            sqrt_price_x64_a, sqrt_price_x64_b = sqrt_price_x64_b, sqrt_price_x64_a
-        
-        if round_up:
-            return mul_div_ceil(liquidity, sqrt_price_x64_b - sqrt_price_x64_a, Q64)
-        else:
-            return (liquidity * (sqrt_price_x64_b - sqrt_price_x64_a)) // Q64
+        return amount_a, amount_b
 
 # --- Main Calculation Logic ---
 
-def get_clmm_deposit_amounts(pool_data: dict, deposit_usd: float) -> dict | None:
+async def get_clmm_deposit_amounts(pool_data: dict, deposit_usd: float) -> dict | None:
     """
     Calculates the required amounts of tokenA and tokenB for a given USD deposit
     into a Raydium CLMM pool.
@@ -126,7 +198,7 @@ def get_clmm_deposit_amounts(pool_data: dict, deposit_usd: float) -> dict | None
         decimals_a = mint_a_data.get("decimals")
         decimals_b = mint_b_data.get("decimals")
         
-        current_price = Decimal(pool_data.get("price"))
+        current_price = pool_data.get("price")
         tick_spacing = config_data.get("tickSpacing")
         apy_24h = pool_data.get("day", {}).get("apr", 0) / 100.0
 
@@ -134,36 +206,42 @@ def get_clmm_deposit_amounts(pool_data: dict, deposit_usd: float) -> dict | None
             logger.error("Pool data is missing essential fields for calculation.")
             return None
 
+        current_price = float(current_price)
+
         # 2. Get token prices
-        token_prices = get_token_prices([mint_a, mint_b])
+        token_prices = await get_token_prices([mint_a, mint_b])
         price_a_usd = token_prices.get(mint_a)
         price_b_usd = token_prices.get(mint_b)
         
-        if not all([price_a_usd, price_b_usd]):
-            logger.error(f"Could not fetch valid prices for tokens {mint_a} or {mint_b}.")
+        if price_a_usd is None or price_b_usd is None or price_a_usd <= 0 or price_b_usd <= 0:
+            logger.error("Could not fetch valid prices for tokens %s or %s.", mint_a, mint_b)
             return None
 
         # 3. Define the price range (e.g., +/- 10% of current price)
-        price_lower = current_price * Decimal("0.9")
-        price_upper = current_price * Decimal("1.1")
+        price_lower = current_price * 0.9
+        price_upper = current_price * 1.1
         
-        tick_lower = (int(price_lower.ln() / Decimal("1.0001").ln()) // tick_spacing) * tick_spacing
-        tick_upper = (int(price_upper.ln() / Decimal("1.0001").ln()) // tick_spacing) * tick_spacing
+        tick_lower = (int(math.log(price_lower) / LN_1_0001) // tick_spacing) * tick_spacing
+        tick_upper = (int(math.log(price_upper) / LN_1_0001) // tick_spacing) * tick_spacing
 
         # 4. Convert prices and ticks to Q64.64 format
-        sqrt_price_current_x64 = int((current_price.sqrt()) * Q64)
+        sqrt_price_current_x64 = int(math.sqrt(current_price) * Q64)
         sqrt_price_lower_x64 = SqrtPriceMath.get_sqrt_price_x64_from_tick(tick_lower)
         sqrt_price_upper_x64 = SqrtPriceMath.get_sqrt_price_x64_from_tick(tick_upper)
 
-        # 5. Calculate amounts for a unit of liquidity to find its value
-        unit_liquidity = 1_000_000
+        # 5. Calculate amounts for a unit of liquidity to find its value. Amounts are
+        # linear in liquidity, so a large unit keeps them precise enough to be scaled
+        # to the target liquidity later instead of being recomputed.
+        unit_liquidity = Q64
         unit_amount_a, unit_amount_b = LiquidityMath.get_amounts_from_liquidity(
             sqrt_price_current_x64, sqrt_price_lower_x64, sqrt_price_upper_x64, unit_liquidity, round_up=False
         )
 
         # 6. Calculate the USD value of this unit liquidity
-        unit_value_a_usd = (unit_amount_a / (10**decimals_a)) * price_a_usd
-        unit_value_b_usd = (unit_amount_b / (10**decimals_b)) * price_b_usd
+        scale_a = 10**decimals_a
+        scale_b = 10**decimals_b
+        unit_value_a_usd = (unit_amount_a / scale_a) * price_a_usd
+        unit_value_b_usd = (unit_amount_b / scale_b) * price_b_usd
         unit_value_total_usd = unit_value_a_usd + unit_value_b_usd
         
         if unit_value_total_usd == 0:
@@ -171,16 +249,15 @@ def get_clmm_deposit_amounts(pool_data: dict, deposit_usd: float) -> dict | None
             return None
 
         # 7. Calculate target liquidity for the user's desired USD deposit
-        target_liquidity = (deposit_usd / unit_value_total_usd) * unit_liquidity
+        target_liquidity = int((deposit_usd / unit_value_total_usd) * unit_liquidity)
 
-        # 8. Calculate final token amounts using the target liquidity
-        final_amount_a_raw, final_amount_b_raw = LiquidityMath.get_amounts_from_liquidity(
-            sqrt_price_current_x64, sqrt_price_lower_x64, sqrt_price_upper_x64, int(target_liquidity), round_up=False
-        )
+        # 8. Scale the unit amounts to the target liquidity
+        final_amount_a_raw = unit_amount_a * target_liquidity // unit_liquidity
+        final_amount_b_raw = unit_amount_b * target_liquidity // unit_liquidity
 
         # 9. Convert raw amounts to human-readable format
-        amount_a = final_amount_a_raw / (10**decimals_a)
-        amount_b = final_amount_b_raw / (10**decimals_b)
+        amount_a = final_amount_a_raw / scale_a
+        amount_b = final_amount_b_raw / scale_b
 
         # 10. Calculate estimated yearly return in USD
         yearly_return_usd = deposit_usd * apy_24h
@@ -192,5 +269,5 @@ def get_clmm_deposit_amounts(pool_data: dict, deposit_usd: float) -> dict | None
             "token_b": {"symbol": mint_b_data.get("symbol"), "amount": amount_b},
         }
     except Exception as e:
-        logger.error(f"Error in CLMM deposit calculation: {e}", exc_info=True)
+        logger.error("Error in CLMM deposit calculation: %s", e, exc_info=True)
         return None
\ No newline at end of file
@@ -1,66 +1,179 @@
 import os
 import asyncio
+import html
 import logging
+import logging.handlers
+import queue
+from typing import TYPE_CHECKING
+
+import orjson
 from fastapi import FastAPI, Request, Response
 from fastapi.responses import HTMLResponse
-from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackQueryHandler
-
-from python_bot.bot.handlers import start_handler,  text_and_voice_handler, button_handler
 
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
-)
+from python_bot.core.http_client import close_http_client, get_http_client
+
+if TYPE_CHECKING:
+    from telegram import Update
+    from telegram.ext import Application
+
+# Log records are handed to a background thread through a queue, so handlers never
+# block on writing to stderr while serving updates.
+_log_queue = queue.SimpleQueue()
+_log_stream_handler = logging.StreamHandler()
+_log_stream_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_stream_handler)
+_log_listener.start()
+logging.getLogger().addHandler(logging.handlers.QueueHandler(_log_queue))
+logging.getLogger().setLevel(logging.INFO)
 logger = logging.getLogger(__name__)
 
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
+REDIS_URL = os.getenv("REDIS_URL")
 
 if not TELEGRAM_TOKEN:
     raise ValueError("TELEGRAM_TOKEN is not set in the environment!")
 
+# Handling an update takes seconds (OpenAI + Raydium calls) and Telegram waits for the
+# webhook's 200 before delivering more, so updates are acknowledged right away and
+# processed in the background. Serverless platforms like Vercel freeze the function
+# once the response is sent, so there the update is processed before responding.
+PROCESS_UPDATES_IN_BACKGROUND = os.getenv(
+    "PROCESS_UPDATES_IN_BACKGROUND", "False" if os.getenv("VERCEL") else "True"
+).lower() in ("true", "1", "t")
+
+# telegram.Update, captured by build_application() so the webhook doesn't import it
+# on every update.
+_Update: "type[Update] | None" = None
+# Serializes the first build so a burst of updates on a cold start builds one application.
+_application_lock = asyncio.Lock()
+
+# The event loop only keeps weak references to tasks, so in-flight updates are held here.
+# Each task runs through the application's update processor, so at most its concurrency
+# limit are handled at once and the rest wait for a free slot.
+_background_tasks: set[asyncio.Task] = set()
 
-# --- Telegram Bot Application Setup ---
-# This setup is now simpler as we don't manage the webhook in the app's lifecycle
-application = (
-    Application.builder()
-    .token(TELEGRAM_TOKEN)
-    .read_timeout(30)
-    .write_timeout(30)
-    .build()
-)
 
-application.add_handler(CommandHandler("start", start_handler))
-application.add_handler(MessageHandler(filters.TEXT | filters.VOICE, text_and_voice_handler))
-application.add_handler(CallbackQueryHandler(button_handler))
+# --- Telegram Bot Application Setup ---
+def build_application() -> "Application":
+    """
+    Builds the bot application. The Telegram library and the handlers, with the
+    OpenAI client, engine and Redis they pull in, are imported here rather than at
+    module import, so loading this module stays cheap and only the first Telegram
+    update pays for setting up the bot.
+    """
+    global _Update
+    from telegram import Update
+    from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackQueryHandler
+
+    from python_bot.bot.handlers import start_handler, text_and_voice_handler, button_handler
+    from python_bot.state.storage import RedisPersistence
+
+    # This setup is now simpler as we don't manage the webhook in the app's lifecycle.
+    # Updates are processed concurrently (each one waits on OpenAI and Raydium), up to the
+    # update processor's default limit of 256, so the Bot API connection pool is sized to
+    # match and requests share HTTP/2 connections instead of queueing for a single socket.
+    application_builder = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .read_timeout(30)
+        .write_timeout(30)
+        .connection_pool_size(256)
+        .pool_timeout(20)
+        .http_version("2")
+        .concurrent_updates(True)
+    )
+    if REDIS_URL:
+        # Keep user_data in Redis so several workers and restarts share conversation state.
+        application_builder.persistence(RedisPersistence(REDIS_URL))
+    application = application_builder.build()
+
+    application.add_handler(CommandHandler("start", start_handler))
+    application.add_handler(MessageHandler(filters.TEXT | filters.VOICE, text_and_voice_handler))
+    application.add_handler(CallbackQueryHandler(button_handler))
+    _Update = Update
+    return application
+
+# Update types the handlers act on. Anything else (edited messages, channel
+# posts, polls, ...) is acknowledged without being deserialized.
+_HANDLED_UPDATE_TYPES = frozenset({"message", "callback_query"})
 
 
 # --- FastAPI App and Endpoints ---
 api = FastAPI()
 
+async def _get_application() -> "Application":
+    """
+    Returns the bot application, building and initializing it on first use, so
+    the other endpoints never import the Telegram stack.
+    """
+    application = getattr(api.state, "application", None)
+    if application is not None:
+        return application
+    async with _application_lock:
+        # Another update may have built the application while we waited for the lock.
+        application = getattr(api.state, "application", None)
+        if application is None:
+            application = build_application()
+            await application.initialize()
+            api.state.application = application
+        return application
+
 @api.on_event("startup")
 async def startup():
-    # This is a good place to initialize the bot application,
-    # it runs once when the serverless function starts.
-    await application.initialize()
+    # This runs once when the serverless function starts. The bot application is
+    # left to the first Telegram update (see _get_application), so only the shared
+    # HTTP client is opened here, on the server's event loop; shutdown closes it.
+    get_http_client()
 
 @api.on_event("shutdown")
 async def shutdown():
     # This runs when the serverless function is about to be shut down.
-    await application.shutdown()
+    # Let updates that were already acknowledged finish before tearing down the bot.
+    if _background_tasks:
+        await asyncio.gather(*_background_tasks, return_exceptions=True)
+    application = getattr(api.state, "application", None)
+    if application is not None:
+        await application.shutdown()
+    await close_http_client()
+    _log_listener.stop()
+
+async def _process_update(application: "Application", update: "Update") -> None:
+    """Processes an update and, if persistence is configured, writes back the changed data."""
+    # Updates are fed to the application directly rather than through its update queue,
+    # so they go through the update processor here for its concurrency limit to apply.
+    await application.update_processor.process_update(update, application.process_update(update))
+    # The application is never started, so its periodic persistence job doesn't run.
+    if application.persistence:
+        await application.update_persistence()
+
+async def _process_update_in_background(application: "Application", update: "Update") -> None:
+    """Processes an already acknowledged update, logging any error since no caller awaits it."""
+    try:
+        await _process_update(application, update)
+    except Exception as e:
+        logger.error("Error processing update in background: %s", e, exc_info=True)
 
 @api.post("/telegram")
 async def telegram_webhook(request: Request):
     """Handle incoming Telegram updates by passing them to the bot application."""
     try:
-        data = await request.json()
-        update = Update.de_json(data, application.bot)
+        data = orjson.loads(await request.body())
+        # Skip building the telegram object graph for updates no handler would use.
+        if _HANDLED_UPDATE_TYPES.isdisjoint(data):
+            return Response(status_code=200)
+        application = await _get_application()
+        update = _Update.de_json(data, application.bot)
         
-        # The application is already initialized at startup
-        await application.process_update(update)
+        if PROCESS_UPDATES_IN_BACKGROUND:
+            task = asyncio.create_task(_process_update_in_background(application, update))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+        else:
+            await _process_update(application, update)
         
         return Response(status_code=200)
     except Exception as e:
-        logger.error(f"Error processing update: {e}", exc_info=True)
+        logger.error("Error processing update: %s", e, exc_info=True)
         return Response(status_code=500)
 
 @api.get("/")
@@ -73,48 +186,53 @@ async def test_endpoint():
     """A simple test endpoint to confirm the API is responsive."""
     return {"message": "Hello from your Vercel API!"}
 
-@api.get("/redirect", response_class=HTMLResponse)
-async def redirect_to_solana_action(target: str):
-    """
-    Redirects the user to a Solana Action link from a standard HTTP link.
-    This is a workaround for Telegram buttons not supporting custom URL schemes.
-    """
-    # Basic validation to prevent open redirect vulnerabilities
-    if not target.startswith("solana-action:"):
-        return HTMLResponse("Invalid target URL.", status_code=400)
-
-    import html
-    safe_target = html.escape(target, quote=True)
-
-    return f"""
+# Only the target varies between redirects, so the page is encoded once and split
+# around each occurrence of the target; a request just joins the parts with it.
+_REDIRECT_PAGE_PARTS = b"""
     <!DOCTYPE html>
     <html>
     <head>
         <title>Redirecting...</title>
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <meta http-equiv="refresh" content="0; url={safe_target}" />
+        <meta http-equiv="refresh" content="0; url=$target" />
         <style>
-            body {{ 
+            body { 
                 font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Helvetica, Arial, sans-serif; 
                 display: flex; justify-content: center; align-items: center; height: 100vh; margin: 0;
                 background-color: #1c1c1e; color: #f2f2f7;
-            }}
-            .container {{ 
+            }
+            .container { 
                 text-align: center; padding: 30px; background: #2c2c2e; 
                 border-radius: 12px; box-shadow: 0 4px 12px rgba(0,0,0,0.4);
-            }}
-            h2 {{ margin-top: 0; }}
-            a {{ color: #5856d6; text-decoration: none; font-weight: bold; }}
+            }
+            h2 { margin-top: 0; }
+            a { color: #5856d6; text-decoration: none; font-weight: bold; }
         </style>
         <script type="text/javascript">
-            window.location.href = "{safe_target}";
+            window.location.href = "$target";
         </script>
     </head>
     <body>
         <div class="container">
             <h2>Launching Wallet...</h2>
-            <p>If you are not redirected automatically, please<br/><a href="{safe_target}">click here to open the transaction</a>.</p>
+            <p>If you are not redirected automatically, please<br/><a href="$target">click here to open the transaction</a>.</p>
         </div>
     </body>
     </html>
-    """
\ No newline at end of file
+    """.split(b"$target")
+
+@api.get("/redirect", response_class=HTMLResponse)
+async def redirect_to_solana_action(target: str):
+    """
+    Redirects the user to a Solana Action link from a standard HTTP link.
+    This is a workaround for Telegram buttons not supporting custom URL schemes.
+    """
+    # Basic validation to prevent open redirect vulnerabilities
+    if not target.startswith("solana-action:"):
+        return HTMLResponse("Invalid target URL.", status_code=400)
+
+    safe_target = html.escape(target, quote=True)
+
+    body = safe_target.encode("utf-8").join(_REDIRECT_PAGE_PARTS)
+    # The page is a pure function of `target`, so browsers and the CDN may reuse it.
+    return Response(content=body, media_type="text/html", headers={"Cache-Control": "public, max-age=300"})
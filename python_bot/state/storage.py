@@ -0,0 +1,89 @@
+import orjson
+from redis import asyncio as redis
+from telegram.ext import BasePersistence, PersistenceInput
+
+# Matches the proposal TTL in the handlers; a user idle for longer has nothing worth keeping.
+USER_DATA_TTL_SECONDS = 900
+
+
+class RedisPersistence(BasePersistence):
+    """
+    Stores each user's `user_data` in Redis so that several workers (or a restarted
+    one) share the same conversation state.
+
+    Every user gets one hash, `{prefix}:user:{user_id}`, with a field per top-level
+    `user_data` key serialized with orjson. The hash expires after `ttl_seconds`
+    without updates. Data is loaded per update in `refresh_user_data` instead of for
+    every user at startup. Chat, bot and callback data are not persisted.
+    """
+
+    def __init__(self, url: str, prefix: str = "solana_bot", ttl_seconds: int = USER_DATA_TTL_SECONDS):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False)
+        )
+        self._redis = redis.from_url(url)
+        self._prefix = prefix
+        self._ttl_seconds = ttl_seconds
+
+    def _user_key(self, user_id: int) -> str:
+        return f"{self._prefix}:user:{user_id}"
+
+    # --- User Data ---
+
+    async def get_user_data(self) -> dict[int, dict]:
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        stored = await self._redis.hgetall(self._user_key(user_id))
+        user_data.clear()
+        user_data.update({field.decode(): orjson.loads(value) for field, value in stored.items()})
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        key = self._user_key(user_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            if data:
+                pipe.hset(key, mapping={field: orjson.dumps(value) for field, value in data.items()})
+                pipe.expire(key, self._ttl_seconds)
+            await pipe.execute()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await self._redis.delete(self._user_key(user_id))
+
+    # --- Not Persisted ---
+
+    async def get_chat_data(self) -> dict[int, dict]:
+        return {}
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def update_conversation(self, name: str, key: tuple, new_state: object | None) -> None:
+        pass
+
+    async def flush(self) -> None:
+        await self._redis.aclose()
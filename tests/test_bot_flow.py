@@ -7,9 +7,13 @@ from dotenv import load_dotenv
 os.environ["USE_MOCK_OPENAI"] = "False"
 
 # We must import the functions *after* setting the environment variables.
-from core.agent import parse_intent_from_text
-from core.engine import find_and_propose_pool
-from core.raydium_helpers import get_clmm_deposit_amounts
+from python_bot.core.agent import parse_intent_from_text
+from python_bot.core.engine import find_and_propose_pool
+from python_bot.core.raydium_helpers import get_clmm_deposit_amounts
+
+# The steps share one event loop, as they would in the bot, so clients opened by
+# one step (e.g. the shared HTTP client) are still usable in the next.
+pytestmark = pytest.mark.asyncio(loop_scope="module")
 
 # --- Fixtures ---
 @pytest.fixture(scope="session", autouse=True)
@@ -25,7 +29,6 @@ requires_cmc = pytest.mark.skipif(not os.getenv("COINMARKETCAP_API_KEY"), reason
 # --- Test Cases ---
 
 @requires_openai
-@pytest.mark.asyncio
 async def test_step_1_intent_parsing_low_risk():
     """
     Tests Step 1: Intent Parsing.
@@ -46,7 +49,6 @@ async def test_step_1_intent_parsing_low_risk():
 
 @requires_openai
 @requires_cmc
-@pytest.mark.asyncio
 async def test_step_2_find_pool_with_intent():
     """
     Tests Step 2: Pool Finding.
@@ -75,7 +77,6 @@ async def test_step_2_find_pool_with_intent():
 
 @requires_openai
 @requires_cmc
-@pytest.mark.asyncio
 async def test_step_3_calculate_deposit_amounts():
     """
     Tests Step 3: Deposit Calculation.
@@ -91,7 +92,7 @@ async def test_step_3_calculate_deposit_amounts():
     deposit_usd = 1000.0  # A sample deposit amount in USD.
 
     # 2. Action: Call the deposit calculation helper.
-    result = get_clmm_deposit_amounts(pool_data, deposit_usd)
+    result = await get_clmm_deposit_amounts(pool_data, deposit_usd)
 
     # 3. Assertions: Check if the calculation result is valid.
     assert result is not None, "Calculation should return a result, not None."
@@ -1,7 +1,14 @@
+import httpx
+import orjson
 import pytest
-from unittest.mock import MagicMock
+import respx
+from functools import lru_cache
+from typing import NamedTuple
 
-from core.engine import find_and_propose_pool
+from python_bot.core.engine import RAYDIUM_CACHE, _fetch_raydium_pools, find_and_propose_pool
+
+# All cases share one event loop instead of each starting its own.
+pytestmark = pytest.mark.asyncio(loop_scope="module")
 
 # --- Mock Constants ---
 USDC_MINT = "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v"
@@ -13,159 +20,228 @@ WIF_MINT = "EKpQGSJtjMFqKZ9KQanSqYXRcF8fBopzL7X6bY42CQny"
 
 # --- Mock API Data ---
 
-# Mock DeFiLlama Stablecoins Data
-MOCK_ALL_STABLECOINS = {USDC_MINT, USDT_MINT, UXD_MINT}
+# Mock CoinMarketCap Top Ranked Tokens Data, as returned by `get_top_ranked_symbols`
+MOCK_TOP_10_SYMBOLS = frozenset({"USDC", "SOL"})
+MOCK_TOP_50_SYMBOLS = frozenset({"USDC", "USDT", "SOL", "JUP", "WIF", "UXD"})
+# Only the stablecoins ranked, so the pick depends on which stable pools clear the TVL threshold
+MOCK_STABLECOIN_SYMBOLS = frozenset({"USDC", "USDT", "UXD"})
+# No mock pool has both tokens ranked
+MOCK_UNMATCHED_SYMBOLS = frozenset({"BONK"})
+
+class MockPool(NamedTuple):
+    """A mock Raydium pool; `as_dict` gives it the API's nested JSON shape."""
+    id: str
+    mintA_addr: str
+    mintA_sym: str
+    mintB_addr: str
+    mintB_sym: str
+    tvl: float
+    vol: float
+    apy: float
 
-# Mock CoinMarketCap Top Ranked Tokens Data
-MOCK_TOP_10_MINTS = {USDC_MINT, SOL_MINT}
-# ADDING UXD_MINT to make the stable-only high-risk test pass
-MOCK_TOP_50_MINTS = {USDC_MINT, USDT_MINT, SOL_MINT, JUP_MINT, WIF_MINT, UXD_MINT}
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "mintA": {"address": self.mintA_addr, "symbol": self.mintA_sym},
+            "mintB": {"address": self.mintB_addr, "symbol": self.mintB_sym},
+            "tvl": self.tvl,
+            "day": {"volume": self.vol, "apr": self.apy * 100},
+        }
 
-def create_mock_pool(pool_id, mintA, symbolA, mintB, symbolB, tvl, vol, apy):
-    """Helper function to create a mock pool dictionary."""
-    return {
-        "id": pool_id,
-        "mintA": {"address": mintA, "symbol": symbolA},
-        "mintB": {"address": mintB, "symbol": symbolB},
-        "tvl": tvl,
-        "day": {"volume": vol, "apr": apy * 100},
-    }
+MOCK_POOLS = (
+    MockPool("pool1", USDC_MINT, "USDC", SOL_MINT, "SOL", 50_000_000, 100_000_000, 0.15),
+    MockPool("pool2", USDC_MINT, "USDC", USDT_MINT, "USDT", 20_000_000, 50_000_000, 0.08),
+    MockPool("pool3", JUP_MINT, "JUP", WIF_MINT, "WIF", 10_000_000, 40_000_000, 0.50),
+    MockPool("pool4", USDC_MINT, "USDC", UXD_MINT, "UXD", 500_000, 1_000_000, 0.12),
+    MockPool("pool5", USDT_MINT, "USDT", UXD_MINT, "UXD", 200_000, 500_000, 0.10),
+)
 
 # Mock Raydium Pools Data (sorted by volume descending, as in the real API)
-MOCK_RAYDIUM_POOLS = [
-    create_mock_pool("pool1", USDC_MINT, "USDC", SOL_MINT, "SOL", 50_000_000, 100_000_000, 0.15),
-    create_mock_pool("pool2", USDC_MINT, "USDC", USDT_MINT, "USDT", 20_000_000, 50_000_000, 0.08),
-    create_mock_pool("pool3", JUP_MINT, "JUP", WIF_MINT, "WIF", 10_000_000, 40_000_000, 0.50),
-    create_mock_pool("pool4", USDC_MINT, "USDC", UXD_MINT, "UXD", 500_000, 1_000_000, 0.12),
-    create_mock_pool("pool5", USDT_MINT, "USDT", UXD_MINT, "UXD", 200_000, 500_000, 0.10),
-]
+MOCK_RAYDIUM_POOLS = [pool.as_dict() for pool in MOCK_POOLS]
 
-MOCK_RAYDIUM_API_RESPONSE = {
-    "data": {
-        "data": MOCK_RAYDIUM_POOLS
-    }
-}
+# Pools in the order the engine caches them: highest APR first, ties in volume order.
+_POOLS_BY_APR = tuple(sorted(MOCK_RAYDIUM_POOLS, key=lambda pool: -pool["day"]["apr"]))
+
+# Raydium response bodies are stateless, so each page is encoded once and shared by every case.
+@lru_cache(maxsize=None)
+def _raydium_page_body(page, page_size):
+    """Mock Raydium response body holding one page of `MOCK_RAYDIUM_POOLS`."""
+    start = (page - 1) * page_size
+    return orjson.dumps({"data": {"data": MOCK_RAYDIUM_POOLS[start:start + page_size]}})
+
+def _mock_raydium_get(request):
+    """
+    Serves the page of mock pools selected by the `page` and `pageSize` query
+    parameters, so paged fetches are covered too.
+    """
+    page = int(request.url.params.get("page", 1))
+    page_size = int(request.url.params.get("pageSize", len(MOCK_RAYDIUM_POOLS)))
+    return httpx.Response(200, content=_raydium_page_body(page, page_size), headers={"Content-Type": "application/json"})
 
 
 # --- Test Cases ---
+# Expected pool names, keyed by "<ranked symbols>/<risk>". The engine proposes the
+# highest-APR pool whose TVL clears the risk threshold (low: $5M, medium: $1M,
+# high: $100k) and whose two symbols are both top-ranked.
+EXPECTED_POOL_NAMES = {
+    "top50/low": "JUP-WIF", # Highest APR overall, and its $10M TVL clears every threshold
+    "top50/medium": "JUP-WIF",
+    "top50/high": "JUP-WIF",
+    "top100/medium": "JUP-WIF",
+    "top10/low": "USDC-SOL", # The only pool with both tokens in the top 10
+    "stablecoins/low": "USDC-USDT", # USDC-UXD pays more but its $500k TVL is under $5M
+    "stablecoins/medium": "USDC-USDT", # ...and under $1M
+    "stablecoins/high": "USDC-UXD", # $500k clears the $100k threshold, so the higher APR wins
+    "unmatched/low": None,
+}
+
+# Cases grouped by the mocked top-ranked symbols, so the engine is patched once per
+# group and every intent in it runs against the same mocks.
+# Each case is (id, intent, expected pool name).
 TEST_CASES = [
     pytest.param(
-        {
-            "risk_level": "low",
-            "market_cap_rank_limit": 50,
-            "only_stablecoins": True
-        },
-        MOCK_TOP_50_MINTS,
-        "USDC-USDT",
-        id="Low Risk, Top 50, Stablecoin-Only"
+        MOCK_TOP_50_SYMBOLS,
+        [
+            (
+                "Low Risk, Top 50",
+                {"risk_level": "low", "market_cap_rank_limit": 50},
+                EXPECTED_POOL_NAMES["top50/low"],
+            ),
+            (
+                "Medium Risk, Top 50",
+                {"risk_level": "medium", "market_cap_rank_limit": 50},
+                EXPECTED_POOL_NAMES["top50/medium"],
+            ),
+            (
+                "High Risk, Top 50",
+                {"risk_level": "high", "market_cap_rank_limit": 50},
+                EXPECTED_POOL_NAMES["top50/high"],
+            ),
+            (
+                "Medium Risk, Top 100",
+                # Top 50 is our mock for "top 100"
+                {"risk_level": "medium", "market_cap_rank_limit": 100},
+                EXPECTED_POOL_NAMES["top100/medium"],
+            ),
+        ],
+        id="Top 50",
     ),
     pytest.param(
-        {
-            "risk_level": "low",
-            "market_cap_rank_limit": 50,
-            "only_stablecoins": False
-        },
-        MOCK_TOP_50_MINTS,
-        "USDC-SOL",
-        id="Low Risk, Top 50, Any Pair with Stable"
+        MOCK_TOP_10_SYMBOLS,
+        [
+            (
+                "Low Risk, Top 10",
+                {"risk_level": "low", "market_cap_rank_limit": 10},
+                EXPECTED_POOL_NAMES["top10/low"],
+            ),
+        ],
+        id="Top 10",
     ),
     pytest.param(
-        {
-            "risk_level": "medium",
-            "market_cap_rank_limit": 50,
-            "only_stablecoins": True,
-        },
-        MOCK_TOP_50_MINTS,
-        "USDC-USDT", # USDC-UXD has low TVL, so finds USDC-USDT instead
-        id="Medium Risk, Top 50, Stable-Only"
+        MOCK_STABLECOIN_SYMBOLS,
+        [
+            (
+                "Low Risk, Stablecoins Ranked",
+                {"risk_level": "low", "market_cap_rank_limit": 50},
+                EXPECTED_POOL_NAMES["stablecoins/low"],
+            ),
+            (
+                "Medium Risk, Stablecoins Ranked",
+                {"risk_level": "medium", "market_cap_rank_limit": 50},
+                EXPECTED_POOL_NAMES["stablecoins/medium"],
+            ),
+            (
+                "High Risk, Stablecoins Ranked",
+                {"risk_level": "high", "market_cap_rank_limit": 50},
+                EXPECTED_POOL_NAMES["stablecoins/high"],
+            ),
+        ],
+        id="Stablecoins Ranked",
     ),
     pytest.param(
-        {
-            "risk_level": "high",
-            "market_cap_rank_limit": 50,
-            "only_stablecoins": True,
-        },
-        MOCK_TOP_50_MINTS,
-        "USDC-UXD", # High risk lowers TVL threshold to 0 and now finds highest APY stable-only pool
-        id="High Risk, Top 50, Stable-Only (finds best APY)"
-    ),
-     pytest.param(
-        {
-            "risk_level": "high",
-            "market_cap_rank_limit": 50,
-            "only_stablecoins": False,
-        },
-        MOCK_TOP_50_MINTS,
-        "JUP-WIF", # UPDATED: Should find the high APY non-stable pool
-        id="High Risk, Top 50, Any Pair with Stable (finds best APY)"
-    ),
-    pytest.param(
-        {
-            "risk_level": "low",
-            "market_cap_rank_limit": 10,
-            "only_stablecoins": True
-        },
-        MOCK_TOP_10_MINTS,
-        None, # No pool with two top-10 stablecoins in our mock data
-        id="No Match - Too strict market cap for stable-only"
-    ),
-    pytest.param(
-        {
-            "risk_level": "low",
-            "market_cap_rank_limit": 10,
-            "only_stablecoins": False
-        },
-        MOCK_TOP_10_MINTS,
-        "USDC-SOL", # USDC is a top 10 stable, SOL is a top 10 token
-        id="Match - Top 10, Any Pair with Stable"
-    ),
-    pytest.param(
-        {
-            "risk_level": "medium",
-            "market_cap_rank_limit": 100, # Assume this doesn't add new stablecoins to top ranks
-            "only_stablecoins": True
-        },
-        MOCK_TOP_50_MINTS, # Use top 50 as our mock for "top 100"
-        "USDC-USDT", # USDC-UXD still fails because UXD is not in the top 50 mints
-        id="No Match - Stablecoin not in market cap rank"
+        MOCK_UNMATCHED_SYMBOLS,
+        [
+            (
+                "No Match - No pool with both tokens ranked",
+                {"risk_level": "low", "market_cap_rank_limit": 50},
+                EXPECTED_POOL_NAMES["unmatched/low"],
+            ),
+        ],
+        id="No Match",
     ),
 ]
 
 
-@pytest.mark.parametrize("intent, mock_top_mints, expected_pool_name", TEST_CASES)
-async def test_find_and_propose_pool_scenarios(mocker, intent, mock_top_mints, expected_pool_name):
+# --- Fixtures ---
+@pytest.fixture(autouse=True)
+def mock_raydium_api():
+    """Routes every Raydium API request made through httpx to the mock pools."""
+    with respx.mock(assert_all_called=False) as router:
+        router.get(url__regex=r"^https://api-v3\.raydium\.io/").mock(side_effect=_mock_raydium_get)
+        yield router
+
+
+@pytest.fixture
+def patched_engine(mocker, request):
     """
-    Tests the find_and_propose_pool function with various mocked intents and market data.
-    This test will print the found pool for manual verification as requested.
+    Mocks the engine's CoinMarketCap lookup. The top-ranked symbols are supplied
+    per test case through indirect parametrization.
     """
-    print(f"\n--- Testing Intent: {intent} ---")
-    
-    # Mock the external data-fetching functions
-    mocker.patch(
-        'core.engine.get_solana_stablecoins_from_defillama',
-        return_value=MOCK_ALL_STABLECOINS
-    )
     mocker.patch(
-        'core.engine.get_top_ranked_solana_mints',
-        return_value=mock_top_mints
+        'python_bot.core.engine.get_top_ranked_symbols',
+        return_value=request.param
     )
-    
-    # Mock the requests.get call to Raydium
-    mock_response = MagicMock()
-    mock_response.json.return_value = MOCK_RAYDIUM_API_RESPONSE
-    mock_response.raise_for_status.return_value = None
-    mocker.patch('requests.get', return_value=mock_response)
-    
-    # --- Execute ---
-    result = await find_and_propose_pool(intent)
-    
-    # --- Print for Manual Verification ---
-    if result:
-        print(f"Found Pool: {result['pool_name']} | TVL: ${result['liquidity']:,.0f} | APY: {result['apy']:.2%}")
-        found_pool_name = result['pool_name']
-    else:
-        print("Found Pool: None")
-        found_pool_name = None
-
-    # --- Assert (for automated testing) ---
-    assert found_pool_name == expected_pool_name
\ No newline at end of file
+
+
+@pytest.mark.parametrize("patched_engine, cases", TEST_CASES, indirect=["patched_engine"])
+async def test_find_and_propose_pool_scenarios(request, patched_engine, cases):
+    """
+    Tests the find_and_propose_pool function with various mocked intents and market data.
+    When run with -v, this test also prints the found pool for manual verification.
+    """
+    verbose = request.config.getoption("verbose") > 0
+
+    for case_id, intent, expected_pool_name in cases:
+        if verbose:
+            print(f"\n--- Testing Intent: {intent} ---")
+
+        # --- Execute ---
+        result = await find_and_propose_pool(intent)
+
+        found_pool_name = result['pool_name'] if result else None
+
+        # --- Print for Manual Verification ---
+        if verbose:
+            if result:
+                print(f"Found Pool: {result['pool_name']} | TVL: ${result['liquidity']:,.0f} | APY: {result['apy']:.2%}")
+            else:
+                print("Found Pool: None")
+
+        # --- Assert (for automated testing) ---
+        assert found_pool_name == expected_pool_name, case_id
+
+
+async def test_raydium_pools_are_cached_by_apr(monkeypatch):
+    """
+    Pools are sorted by APR once per fetch, so pool selection can stop at the first
+    pool that passes its filters instead of scanning them all.
+    """
+    monkeypatch.setitem(RAYDIUM_CACHE, "timestamp", 0)
+
+    pools, _ = await _fetch_raydium_pools()
+
+    assert [pool["id"] for pool in pools] == [pool["id"] for pool in _POOLS_BY_APR]
+
+
+async def test_repeat_intent_reuses_cached_raydium_pools(monkeypatch, mock_raydium_api):
+    """A repeated intent within the cache window is answered without fetching pools again."""
+    monkeypatch.setattr("python_bot.core.engine.COINMARKETCAP_API_KEY", None)
+    monkeypatch.setitem(RAYDIUM_CACHE, "timestamp", 0)
+    intent = {"risk_level": "low", "market_cap_rank_limit": 50}
+
+    first = await find_and_propose_pool(intent)
+    second = await find_and_propose_pool(intent)
+
+    assert first is not None
+    assert second == first
+    assert mock_raydium_api.calls.call_count == 1
@@ -0,0 +1,141 @@
+import asyncio
+
+import httpx
+import pytest
+import respx
+
+from python_bot.core.raydium_helpers import (
+    RAYDIUM_MINT_PRICE_API_URL,
+    _PRICE_CACHE,
+    _PRICE_REQUESTS_IN_FLIGHT,
+    get_clmm_deposit_amounts,
+    get_token_prices,
+)
+
+pytestmark = pytest.mark.asyncio(loop_scope="module")
+
+# --- Mock Constants ---
+USDC_MINT = "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v"
+SOL_MINT = "So11111111111111111111111111111111111111112"
+
+MOCK_PRICES = {USDC_MINT: 1.0, SOL_MINT: 150.0}
+
+# A SOL-USDC CLMM pool, with only the fields the deposit calculation reads.
+MOCK_CLMM_POOL = {
+    "mintA": {"address": SOL_MINT, "symbol": "SOL", "decimals": 9},
+    "mintB": {"address": USDC_MINT, "symbol": "USDC", "decimals": 6},
+    "price": 150.0,
+    "config": {"tickSpacing": 1},
+    "day": {"apr": 12.0},
+}
+
+
+async def _mock_price_get(request):
+    """
+    Answers a Raydium price request for the requested mints. The short sleep keeps
+    the request in flight long enough for concurrent lookups to find it.
+    """
+    await asyncio.sleep(0.01)
+    mints = request.url.params["mints"].split(",")
+    return httpx.Response(200, json={"data": {mint: {"price": MOCK_PRICES[mint]} for mint in mints}})
+
+
+async def _mock_price_error(request):
+    """Fails a Raydium price request after the same delay as `_mock_price_get`."""
+    await asyncio.sleep(0.01)
+    return httpx.Response(500)
+
+
+# --- Fixtures ---
+@pytest.fixture(autouse=True)
+def empty_price_cache():
+    """Each test starts without cached prices."""
+    _PRICE_CACHE.clear()
+    yield
+    _PRICE_CACHE.clear()
+
+
+@pytest.fixture
+def mock_price_api():
+    """Routes Raydium price requests to `_mock_price_get`."""
+    with respx.mock() as router:
+        route = router.get(url__startswith=RAYDIUM_MINT_PRICE_API_URL).mock(side_effect=_mock_price_get)
+        yield route
+
+
+# --- Tests ---
+async def test_concurrent_lookups_share_one_request(mock_price_api):
+    """A lookup for mints already being fetched waits for that request instead of sending its own."""
+    first, second = await asyncio.gather(
+        get_token_prices([USDC_MINT, SOL_MINT]),
+        get_token_prices([USDC_MINT, SOL_MINT]),
+    )
+
+    assert first == second == MOCK_PRICES
+    assert mock_price_api.call_count == 1
+    assert not _PRICE_REQUESTS_IN_FLIGHT
+
+
+async def test_cached_prices_are_not_fetched_again(mock_price_api):
+    """Prices fetched within the cache window are answered from the cache."""
+    await get_token_prices([USDC_MINT, SOL_MINT])
+    assert mock_price_api.call_count == 1
+
+    prices = await get_token_prices([USDC_MINT, SOL_MINT])
+
+    assert prices == MOCK_PRICES
+    assert mock_price_api.call_count == 1
+
+
+async def test_failed_fetch_resolves_waiters_without_caching(mock_price_api):
+    """A failed fetch gives every waiting lookup no prices, and the next lookup tries again."""
+    mock_price_api.side_effect = _mock_price_error
+
+    first, second = await asyncio.gather(
+        get_token_prices([USDC_MINT, SOL_MINT]),
+        get_token_prices([USDC_MINT, SOL_MINT]),
+    )
+
+    assert first == second == {}
+    assert mock_price_api.call_count == 1
+    assert not _PRICE_REQUESTS_IN_FLIGHT
+    assert USDC_MINT not in _PRICE_CACHE and SOL_MINT not in _PRICE_CACHE
+
+    mock_price_api.side_effect = _mock_price_get
+    assert await get_token_prices([USDC_MINT, SOL_MINT]) == MOCK_PRICES
+    assert mock_price_api.call_count == 2
+
+
+async def test_mints_without_a_price_are_left_out(mock_price_api):
+    """A mint the response has no price for is reported and cached as unavailable, not as free."""
+    mock_price_api.side_effect = lambda request: httpx.Response(
+        200, json={"data": {USDC_MINT: {"price": 1.0}, SOL_MINT: {}}}
+    )
+
+    prices = await get_token_prices([USDC_MINT, SOL_MINT])
+
+    assert prices == {USDC_MINT: 1.0}
+    assert SOL_MINT not in _PRICE_CACHE
+
+
+async def test_deposit_amounts_use_both_prices(mock_price_api):
+    """With both prices known, the token amounts add up to the requested deposit."""
+    result = await get_clmm_deposit_amounts(MOCK_CLMM_POOL, 1000.0)
+
+    assert result is not None
+    value_usd = (
+        result["token_a"]["amount"] * MOCK_PRICES[SOL_MINT]
+        + result["token_b"]["amount"] * MOCK_PRICES[USDC_MINT]
+    )
+    assert value_usd == pytest.approx(1000.0, rel=1e-6)
+
+
+@pytest.mark.parametrize("price_data", [{}, {"price": 0}], ids=["missing", "zero"])
+@pytest.mark.parametrize("unpriced_mint", [SOL_MINT, USDC_MINT], ids=["token A", "token B"])
+async def test_deposit_amounts_need_both_prices(mock_price_api, unpriced_mint, price_data):
+    """A deposit isn't proposed when either token has no usable price."""
+    mock_price_api.side_effect = lambda request: httpx.Response(
+        200, json={"data": {**{mint: {"price": price} for mint, price in MOCK_PRICES.items()}, unpriced_mint: price_data}}
+    )
+
+    assert await get_clmm_deposit_amounts(MOCK_CLMM_POOL, 1000.0) is None